@@ -4,11 +4,14 @@ import tempfile
 from pathlib import Path
 import time
 import datetime
-import threading
+import multiprocessing
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import shutil
 import logging
 import json
-from modules import utils, transcriber, pdf_generator
+from modules import utils, jobs
 import ssl
 
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -30,81 +33,144 @@ os.makedirs("output", exist_ok=True)
 os.makedirs("jobs", exist_ok=True)
 os.makedirs("temp_processing", exist_ok=True)
 
+@st.cache_data(ttl=2)
+def _cached_list_jobs():
+    """List jobs, reusing the parsed result across reruns for a couple of seconds."""
+    return utils.list_jobs()
+
+@st.cache_data(ttl=2)
+def _cached_load_status(job_id):
+    """Load a job's status, reusing the parsed result across reruns for a couple of seconds."""
+    return utils.load_job_status(job_id)
+
+# Number of characters of the transcript shown in the preview
+PREVIEW_CHARS = 1000
+
+@st.cache_data(ttl=60)
+def _read_transcript_preview(txt_path, mtime):
+    """Read just enough of a transcript for the preview; mtime keys the cache to the file version."""
+    with open(txt_path, "r") as file:
+        text_content = file.read(PREVIEW_CHARS + 1)
+    return text_content[:PREVIEW_CHARS] + ("..." if len(text_content) > PREVIEW_CHARS else "")
+
+def invalidate_job_cache():
+    """Drop cached job data after a job changes on disk."""
+    _cached_list_jobs.clear()
+    _cached_load_status.clear()
+
 # Initialize session state
 if 'current_job_id' not in st.session_state:
     st.session_state.current_job_id = None
 if 'jobs' not in st.session_state:
-    st.session_state.jobs = utils.list_jobs()
+    st.session_state.jobs = _cached_list_jobs()
 if 'show_job' not in st.session_state:
     st.session_state.show_job = None
 if 'user_feedback' not in st.session_state:
     st.session_state.user_feedback = None
 
-def update_job_progress(job_id, text, progress):
-    """Update job progress in job status file."""
-    job_status = utils.load_job_status(job_id) or {}
-    job_status['status'] = text
-    job_status['progress'] = progress
-    job_status['updated_at'] = datetime.datetime.now().isoformat()
-    utils.save_job_status(job_id, job_status)
+@st.cache_resource
+def get_job_executor():
+    """Return the process pool that runs transcription jobs, shared by all sessions.
     
-    # Update jobs list in session state
-    st.session_state.jobs = utils.list_jobs()
+    MAX_JOBS bounds how many jobs (and Whisper models) run at once; further
+    submissions wait in the pool's queue.
+    """
+    return ProcessPoolExecutor(
+        max_workers=int(os.environ.get("MAX_JOBS", 1)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=jobs.init_worker
+    )
 
-def process_video_thread(job_id, video_path, whisper_model, 
-                         chunk_duration, timestamp_interval):
-    """Process video in a separate thread."""
+@st.cache_resource
+def get_job_futures():
+    """Return the futures of queued and running jobs keyed by job ID, shared by all sessions."""
+    return {}
+
+def submit_to_executor(fn, *args):
+    """Submit work to the job pool, replacing the pool if a dead worker has broken it."""
+    executor = get_job_executor()
     try:
-        # Update job status to "in progress"
-        update_job_progress(job_id, "Starting processing...", 0)
-        
-        # Call the transcriber function with progress updates
-        timestamped_chunks, screenshots = transcriber.process_video(
-            job_id, video_path, whisper_model, 
-            chunk_duration, timestamp_interval,
-            progress_callback=update_job_progress
-        )
-        
-        # Generate output file paths
-        job_dir = os.path.join("output", job_id)
-        os.makedirs(job_dir, exist_ok=True)
-        
-        txt_path = os.path.join(job_dir, "transcript.txt")
-        pdf_path = os.path.join(job_dir, "transcript.pdf")
-        
-        # Save text transcript
-        update_job_progress(job_id, "Saving text transcript...", 95)
-        pdf_generator.save_transcript_to_text(timestamped_chunks, txt_path)
-        
-        # Create PDF with screenshots
-        update_job_progress(job_id, "Creating PDF with screenshots...", 98)
-        pdf_generator.create_pdf_with_screenshots(timestamped_chunks, screenshots, pdf_path)
-        
-        # Update job status to "completed"
-        job_status = utils.load_job_status(job_id) or {}
-        job_status['status'] = "Completed"
-        job_status['progress'] = 100
-        job_status['completed_at'] = datetime.datetime.now().isoformat()
-        job_status['txt_path'] = txt_path
-        job_status['pdf_path'] = pdf_path
-        job_status['num_screenshots'] = len(screenshots)
-        job_status['num_segments'] = len(timestamped_chunks)
-        utils.save_job_status(job_id, job_status)
-        
-        # Update jobs list in session state
-        st.session_state.jobs = utils.list_jobs()
-        
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Job worker pool is broken, starting a new one")
+        executor.shutdown(wait=False)
+        get_job_executor.clear()
+        return get_job_executor().submit(fn, *args)
+
+def _on_job_done(job_id, futures, future):
+    """Mark a job failed when its worker raised outside process_video_job, e.g. because it died."""
+    if futures.get(job_id) is future:
+        futures.pop(job_id, None)
+    if future.cancelled() or future.exception() is None:
+        return
+    
+    error = future.exception()
+    logger.error(f"Job {job_id} failed in its worker: {error}")
+    
+    # Deleted jobs stay deleted
+    job_status = utils.load_job_status(job_id)
+    if job_status is None:
+        return
+    job_status['status'] = f"Failed: {error}"
+    job_status['error'] = str(error)
+    utils.save_job_status(job_id, job_status)
+
+def submit_job(job_id, video_path, whisper_model, timestamp_interval):
+    """Queue a job in the worker pool and track its future."""
+    # A job loads its own model, so a warm-up still queued ahead of it is wasted
+    cancel_warm_up()
+    future = submit_to_executor(jobs.process_video_job, job_id, video_path,
+                                whisper_model, timestamp_interval)
+    futures = get_job_futures()
+    futures[job_id] = future
+    future.add_done_callback(functools.partial(_on_job_done, job_id, futures))
+
+@st.cache_resource
+def get_warm_up_state():
+    """Return the shared holder for the pending model warm-up future."""
+    return {}
+
+def cancel_warm_up():
+    """Cancel a model warm-up that hasn't started; returns False if one is still running."""
+    state = get_warm_up_state()
+    future = state.get('future')
+    if future is None or future.done() or future.cancel():
+        state.pop('future', None)
+        return True
+    return False
+
+def _on_warm_up_done(model_size, future):
+    """Log a failed model warm-up, which would otherwise go unnoticed."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error warming up Whisper {model_size} model: {future.exception()}")
+
+def warm_up_model(model_size):
+    """Queue a warm-up of `model_size`, replacing any warm-up that hasn't started."""
+    if not cancel_warm_up():
+        # Don't queue another full model load behind one that is already running
+        logger.info(f"A model warm-up is already running, not warming {model_size}")
+        return
+    future = submit_to_executor(jobs.warm_up_model, model_size)
+    get_warm_up_state()['future'] = future
+    future.add_done_callback(functools.partial(_on_warm_up_done, model_size))
+
+def cancel_job(job_id):
+    """Cancel a job still waiting in the queue; a running job stops itself once it is deleted."""
+    future = get_job_futures().pop(job_id, None)
+    if future:
+        future.cancel()
+
+# Warm the Whisper model in the job worker so it's loaded by the time the
+# user has picked a video; jobs in that worker reuse the same cached instance.
+# Workers cache a single model, so picking another size replaces it, and with
+# MAX_JOBS > 1 only whichever worker runs the warm-up is preloaded
+preferred_model = st.session_state.get("preferred_model", "base")
+if st.session_state.get('warmed_model') != preferred_model:
+    st.session_state.warmed_model = preferred_model
+    try:
+        warm_up_model(preferred_model)
     except Exception as e:
-        logger.error(f"Error in processing thread: {str(e)}", exc_info=True)
-        
-        # Update job status to "failed"
-        job_status = utils.load_job_status(job_id) or {}
-        job_status['status'] = f"Failed: {str(e)}"
-        job_status['error'] = str(e)
-        utils.save_job_status(job_id, job_status)
-        
-        # Update jobs list in session state
-        st.session_state.jobs = utils.list_jobs()
+        logger.error(f"Error warming up Whisper model: {str(e)}")
 
 def create_new_job():
     """Create a new job and return the job ID."""
@@ -114,16 +180,16 @@ def create_new_job():
     job_status = {
         'job_id': job_id,
         'filename': video_file.name if video_file else "Unknown",
-        'status': "Created",
+        'status': "Queued",
         'progress': 0,
         'created_at': datetime.datetime.now().isoformat(),
         'settings': {
-            'chunk_duration': chunk_duration,
             'timestamp_interval': timestamp_interval,
             'whisper_model': whisper_model
         }
     }
     utils.save_job_status(job_id, job_status)
+    invalidate_job_cache()
     
     return job_id
 
@@ -133,27 +199,37 @@ def show_job_details(job_id):
 
 def refresh_jobs():
     """Refresh the jobs list."""
-    st.session_state.jobs = utils.list_jobs()
+    invalidate_job_cache()
+    st.session_state.jobs = _cached_list_jobs()
 
-def delete_job_handler(job_id):
-    """Handle job deletion."""
+def delete_job_handler(job_id, from_sidebar=False):
+    """Handle job deletion; runs as a button callback, before the script reruns."""
+    cancel_job(job_id)
     if utils.delete_job(job_id):
-        # Remove from session state if this is the current job
-        if st.session_state.show_job == job_id:
-            st.session_state.show_job = None
-        
         # Update job list
-        st.session_state.jobs = utils.list_jobs()
-        st.session_state.user_feedback = f"Job {job_id} deleted successfully."
+        invalidate_job_cache()
+        st.session_state.jobs = _cached_list_jobs()
         
-        # Force a rerun to update the UI
-        st.rerun()
+        # Remove from session state if this is the current job, which
+        # needs a full rerun to clear the main panel
+        if st.session_state.show_job == job_id:
+            st.session_state.user_feedback = f"Job {job_id} deleted successfully."
+            st.session_state.show_job = None
+            # A sidebar click only reruns the sidebar fragment, which then
+            # reruns the whole app
+            st.session_state.rerun_app = from_sidebar
+        else:
+            # Only the sidebar needs to update; the feedback area is only
+            # drawn on a full rerun, so the sidebar confirms with a toast
+            st.session_state.sidebar_toast = f"Job {job_id} deleted successfully."
 
 def clear_all_jobs():
     """Clear all jobs."""
-    jobs = utils.list_jobs()
-    for job in jobs:
+    all_jobs = utils.list_jobs()
+    for job in all_jobs:
+        cancel_job(job['job_id'])
         utils.delete_job(job['job_id'])
+    invalidate_job_cache()
     
     # Reset session state
     st.session_state.show_job = None
@@ -163,10 +239,17 @@ def clear_all_jobs():
     # Force a rerun to update the UI
     st.rerun()
 
-# Create a sidebar for job management and display
-with st.sidebar:
+@st.fragment(run_every=2)
+def render_jobs_sidebar():
+    """Render the jobs panel; reruns on its own so progress updates without a full page rerun."""
     st.header("Jobs")
     
+    if st.session_state.pop('rerun_app', False):
+        st.rerun()
+    
+    if st.session_state.get('sidebar_toast'):
+        st.toast(st.session_state.pop('sidebar_toast'))
+    
     # Job management buttons
     col1, col2 = st.columns(2)
     with col1:
@@ -178,6 +261,7 @@ with st.sidebar:
             clear_all_jobs()
     
     # Display existing jobs
+    st.session_state.jobs = _cached_list_jobs()
     if not st.session_state.jobs:
         st.info("No jobs available")
     else:
@@ -191,7 +275,7 @@ with st.sidebar:
                     job_name = f"❌ {job_name}"
                 else:
                     # Show progress if available
-                    job_data = utils.load_job_status(job['job_id'])
+                    job_data = _cached_load_status(job['job_id'])
                     if job_data and 'progress' in job_data:
                         progress = job_data.get('progress', 0)
                         job_name = f"🔄 {job_name} ({progress}%)"
@@ -202,14 +286,19 @@ with st.sidebar:
                 
                 if st.button(job_name, key=f"job_{job['job_id']}", use_container_width=True):
                     show_job_details(job['job_id'])
+                    st.rerun()
             
             with job_col2:
                 st.write(f"ID: {job['job_id'][:4]}")
             
             with job_col3:
-                if st.button("🗑️", key=f"delete_{job['job_id']}"):
-                    delete_job_handler(job['job_id'])
-    
+                st.button("🗑️", key=f"delete_{job['job_id']}",
+                          on_click=delete_job_handler, args=(job['job_id'], True))
+
+# Create a sidebar for job management and display
+with st.sidebar:
+    render_jobs_sidebar()
+
 # Main panel
 if st.session_state.show_job:
     # Show job details
@@ -256,9 +345,8 @@ if st.session_state.show_job:
                     # Show a preview of the text
                     st.subheader("Text Preview")
                     try:
-                        with open(txt_path, "r") as file:
-                            text_content = file.read()
-                            st.text_area("Transcript", text_content[:1000] + ("..." if len(text_content) > 1000 else ""), height=300)
+                        preview = _read_transcript_preview(txt_path, os.path.getmtime(txt_path))
+                        st.text_area("Transcript", preview, height=300)
                     except Exception as e:
                         st.error(f"Error reading transcript: {e}")
             
@@ -306,8 +394,7 @@ if st.session_state.show_job:
                 st.rerun()
         
         with col2:
-            if st.button("Delete This Job"):
-                delete_job_handler(job_id)
+            st.button("Delete This Job", on_click=delete_job_handler, args=(job_id,))
     else:
         st.error(f"Job {job_id} not found")
         if st.button("Back to Job List"):
@@ -337,28 +424,20 @@ else:
             "Whisper Model Size",
             ["tiny", "base", "small", "medium", "large"],
             index=1,  # Default to "base"
+            key="preferred_model",
             help="Larger models are more accurate but slower. Base is a good balance."
         )
     
     with col2:
-        chunk_duration = st.slider(
-            "Audio Chunk Duration (seconds)",
-            min_value=60,
-            max_value=600,
-            value=180,
-            step=30,
-            help="Smaller chunks may improve accuracy but increase processing time"
+        timestamp_interval = st.slider(
+            "Screenshot Interval (seconds)",
+            min_value=10,
+            max_value=120,
+            value=30,
+            step=5,
+            help="How often to take screenshots from the video"
         )
     
-    timestamp_interval = st.slider(
-        "Screenshot Interval (seconds)",
-        min_value=10,
-        max_value=120,
-        value=30,
-        step=5,
-        help="How often to take screenshots from the video"
-    )
-    
     # Submit button
     submit_button = st.button(
         "Start Transcription",
@@ -369,6 +448,7 @@ else:
     # Process submission
     if submit_button and video_file is not None:
         with st.spinner("Preparing job..."):
+            job_id = None
             try:
                 # Create job directory
                 job_id = create_new_job()
@@ -384,13 +464,8 @@ else:
                 with open(video_path, "wb") as f:
                     f.write(video_file.getbuffer())
                 
-                # Start processing in a thread
-                thread = threading.Thread(
-                    target=process_video_thread,
-                    args=(job_id, video_path, whisper_model, chunk_duration, timestamp_interval)
-                )
-                thread.daemon = True
-                thread.start()
+                # Queue processing in the job worker pool
+                submit_job(job_id, video_path, whisper_model, timestamp_interval)
                 
                 # Show success message and redirect to job view
                 st.session_state.current_job_id = job_id
@@ -403,6 +478,14 @@ else:
             except Exception as e:
                 logger.error(f"Error setting up job: {str(e)}", exc_info=True)
                 st.error(f"Error: {str(e)}")
+                
+                # Don't leave the job looking queued when it never started
+                job_status = utils.load_job_status(job_id) if job_id else None
+                if job_status:
+                    job_status['status'] = f"Failed: {str(e)}"
+                    job_status['error'] = str(e)
+                    utils.save_job_status(job_id, job_status)
+                    invalidate_job_cache()
 
 # Display user feedback if any
 if st.session_state.user_feedback:
@@ -0,0 +1,97 @@
+import os
+import datetime
+import logging
+import ssl
+from . import utils, transcriber, pdf_generator
+
+logger = logging.getLogger(__name__)
+
+class JobDeleted(Exception):
+    """Raised inside a running job once its status file has been deleted."""
+
+def init_worker():
+    """Prepare a job worker process the same way app.py prepares the Streamlit process."""
+    # Spawned workers start with logging unconfigured
+    logging.basicConfig(level=logging.INFO)
+    
+    # Worker processes download models themselves, so they need the same SSL workaround
+    ssl._create_default_https_context = ssl._create_unverified_context
+    os.environ['PYTHONHTTPSVERIFY'] = '0'
+
+def warm_up_model(model_size):
+    """Load a Whisper model into this worker's cache ahead of the first job."""
+    transcriber.get_whisper_model(model_size, transcriber.get_default_device())
+
+def update_job_progress(job_id, text, progress):
+    """Update job progress, persisting it to the job status file periodically.
+    
+    Raises JobDeleted if the job was deleted while running, so it stops early.
+    """
+    if not utils.job_exists(job_id):
+        raise JobDeleted(job_id)
+    utils.update_job_status(job_id, text, progress)
+
+def process_video_job(job_id, video_path, whisper_model, timestamp_interval):
+    """Process video in a job worker process."""
+    # The job may have been deleted while it waited in the queue
+    if not utils.job_exists(job_id):
+        logger.info(f"Job {job_id} was deleted before it started, skipping")
+        return
+    
+    try:
+        # Update job status to "in progress"
+        update_job_progress(job_id, "Starting processing...", 0)
+        
+        # Call the transcriber function with progress updates
+        timestamped_chunks, screenshots = transcriber.process_video(
+            job_id, video_path, whisper_model, timestamp_interval,
+            progress_callback=update_job_progress
+        )
+        
+        # Generate output file paths
+        job_dir = os.path.join("output", job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        
+        txt_path = os.path.join(job_dir, "transcript.txt")
+        pdf_path = os.path.join(job_dir, "transcript.pdf")
+        
+        # Save text transcript
+        update_job_progress(job_id, "Saving text transcript...", 95)
+        pdf_generator.save_transcript_to_text(timestamped_chunks, txt_path)
+        
+        # Create PDF with screenshots
+        update_job_progress(job_id, "Creating PDF with screenshots...", 98)
+        pdf_generator.create_pdf_with_screenshots(timestamped_chunks, screenshots, pdf_path)
+        
+        # Update job status to "completed"
+        if not utils.job_exists(job_id):
+            raise JobDeleted(job_id)
+        job_status = utils.load_job_status(job_id) or {}
+        job_status['status'] = "Completed"
+        job_status['progress'] = 100
+        job_status['completed_at'] = datetime.datetime.now().isoformat()
+        job_status['txt_path'] = txt_path
+        job_status['pdf_path'] = pdf_path
+        job_status['num_screenshots'] = len(screenshots)
+        job_status['num_segments'] = len(timestamped_chunks)
+        utils.save_job_status(job_id, job_status)
+    
+    except JobDeleted:
+        logger.info(f"Job {job_id} was deleted while running, stopping")
+        # Remove anything written after the deletion
+        utils.delete_job(job_id)
+    
+    except Exception as e:
+        logger.error(f"Error in processing job: {str(e)}", exc_info=True)
+        
+        # Update job status to "failed", unless the job was deleted meanwhile
+        if not utils.job_exists(job_id):
+            return
+        job_status = utils.load_job_status(job_id) or {}
+        job_status['status'] = f"Failed: {str(e)}"
+        job_status['error'] = str(e)
+        utils.save_job_status(job_id, job_status)
+    
+    finally:
+        # Workers outlive their jobs, so drop the job's cached state
+        utils.release_job_state(job_id)
@@ -1,12 +1,92 @@
 from fpdf import FPDF
 from PIL import Image
+import math
 import os
+import struct
+import tempfile
+
+# Layout of each entry, in mm
+PDF_IMAGE_WIDTH = 180
+HEADER_HEIGHT = 10
+LINE_HEIGHT = 5
+ENTRY_SPACING = 10
+
+# Screenshots wider than the display width at 150 DPI (~1063 px) are downscaled
+# before embedding; extra pixels only make the PDF bigger
+PDF_IMAGE_DPI = 150
+MAX_IMAGE_WIDTH = round(PDF_IMAGE_WIDTH / 25.4 * PDF_IMAGE_DPI)
+
+class _Latin1Table(dict):
+    """str.translate table mapping newlines to spaces and non-latin-1 characters to '?'.
+    
+    Entries are filled in on first lookup, so the table only grows with the
+    characters that actually occur in transcripts.
+    """
+    def __missing__(self, codepoint):
+        value = codepoint if codepoint < 0x100 else ord('?')
+        self[codepoint] = value
+        return value
+
+_LATIN1_TABLE = _Latin1Table({ord('\n'): ord(' '), ord('\r'): ord(' ')})
+
+def _jpeg_size(path):
+    """Read (width, height) from a JPEG's SOF header without decoding it; None if not a JPEG."""
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            code = marker[1]
+            
+            # Standalone markers carry no length field
+            if code == 0x01 or 0xD0 <= code <= 0xD8:
+                continue
+            
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack('>H', length_bytes)[0]
+            
+            # SOF0-SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                header = f.read(5)
+                if len(header) < 5:
+                    return None
+                _, height, width = struct.unpack('>BHH', header)
+                return width, height
+            
+            f.seek(length - 2, os.SEEK_CUR)
+
+def _prepare_image(screenshot_path, temp_dir):
+    """Return (path, (width, height)) for the screenshot, downscaled into temp_dir if wider than MAX_IMAGE_WIDTH."""
+    # Most screenshots are already small enough; check the header before involving PIL
+    size = _jpeg_size(screenshot_path)
+    if size and size[0] <= MAX_IMAGE_WIDTH:
+        return screenshot_path, size
+    
+    # Decode once, resize and re-encode; FPDF then embeds the small copy
+    with Image.open(screenshot_path) as img:
+        if img.width <= MAX_IMAGE_WIDTH:
+            return screenshot_path, img.size
+        
+        small_size = (MAX_IMAGE_WIDTH, max(1, round(img.height * MAX_IMAGE_WIDTH / img.width)))
+        small = img.convert("RGB").resize(small_size, Image.LANCZOS)
+        small_path = os.path.join(temp_dir, os.path.basename(screenshot_path))
+        small.save(small_path, "JPEG", quality=82, optimize=True)
+        return small_path, small.size
 
 def create_pdf_with_screenshots(transcripts, screenshot_paths, output_pdf_path):
     """Create a PDF with screenshots and corresponding transcripts."""
     print(f"Creating PDF with screenshots and transcripts...")
     
+    # Holds downscaled copies of oversized screenshots until the PDF is written
+    temp_dir = tempfile.TemporaryDirectory()
+    
     pdf = FPDF()
+    pdf.set_compression(True)
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
     pdf.set_font("Arial", size=12)
@@ -16,26 +96,43 @@ def create_pdf_with_screenshots(transcripts, screenshot_paths, output_pdf_path):
     pdf.cell(0, 10, "Video Transcript with Visual References", ln=True, align='C')
     pdf.ln(5)
     
+    # Usable page area, for deciding when an entry needs a fresh page
+    text_width = pdf.w - pdf.l_margin - pdf.r_margin
+    page_bottom = pdf.h - pdf.b_margin
+    page_height = page_bottom - pdf.t_margin
+    
     # Add each screenshot and transcript
-    for i, (timestamp, transcript) in enumerate(transcripts):
+    for timestamp, transcript in transcripts:
+        # Downscale large screenshots so they are embedded at display size
+        image_path = None
+        image_height = 0
+        screenshot_path = screenshot_paths.get(timestamp)
+        if screenshot_path and os.path.exists(screenshot_path):
+            try:
+                image_path, (width, height) = _prepare_image(screenshot_path, temp_dir.name)
+                image_height = PDF_IMAGE_WIDTH * height / width + 5
+            except Exception as e:
+                print(f"Warning: Could not add image {screenshot_path} to PDF: {e}")
+        
+        # Flatten newlines and replace characters the core fonts can't encode in one pass
+        clean_transcript = transcript.translate(_LATIN1_TABLE).strip()
+        
+        # Start a new page only when this entry won't fit in the space left;
+        # entries taller than a page just flow via auto page break
+        pdf.set_font("Arial", size=11)
+        line_count = max(1, math.ceil(pdf.get_string_width(clean_transcript) / text_width))
+        entry_height = HEADER_HEIGHT + image_height + line_count * LINE_HEIGHT + ENTRY_SPACING
+        if pdf.get_y() + min(entry_height, page_height) > page_bottom:
+            pdf.add_page()
+        
         # Add timestamp header
         pdf.set_font("Arial", 'B', 14)
-        pdf.cell(0, 10, f"Time: {timestamp}", ln=True)
+        pdf.cell(0, HEADER_HEIGHT, f"Time: {timestamp}", ln=True)
         
         # Add screenshot if available
-        screenshot_path = screenshot_paths.get(timestamp)
-        if screenshot_path and os.path.exists(screenshot_path):
+        if image_path:
             try:
-                # Get image dimensions
-                with Image.open(screenshot_path) as img:
-                    width, height = img.size
-                
-                # Calculate aspect ratio and resize if needed
-                pdf_width = 180  # PDF width in mm that we want to use
-                pdf_height = pdf_width * height / width
-                
-                # Add image
-                pdf.image(screenshot_path, x=15, w=pdf_width)
+                pdf.image(image_path, x=15, w=PDF_IMAGE_WIDTH)
                 pdf.ln(5)
             except Exception as e:
                 print(f"Warning: Could not add image {screenshot_path} to PDF: {e}")
@@ -43,26 +140,13 @@ def create_pdf_with_screenshots(transcripts, screenshot_paths, output_pdf_path):
         # Add transcript text
         pdf.set_font("Arial", size=11)
         
-        # Handle special characters and encode text properly
-        clean_transcript = transcript.replace('\n', ' ').strip()
-        
-        # Handle encoding issues
         try:
-            # Replace problematic characters
-            clean_transcript = clean_transcript.encode('latin-1', 'replace').decode('latin-1')
-            
-            pdf.multi_cell(0, 5, clean_transcript)
+            pdf.multi_cell(0, LINE_HEIGHT, clean_transcript)
         except Exception as e:
             print(f"Error adding text to PDF: {e}")
-            # Fall back to ASCII
-            pdf.multi_cell(0, 5, clean_transcript.encode('ascii', 'replace').decode('ascii'))
         
         # Add spacing between entries
-        pdf.ln(10)
-        
-        # Add a new page every 2 entries or if the current page is getting full
-        if (i + 1) % 2 == 0 or pdf.get_y() > 250:
-            pdf.add_page()
+        pdf.ln(ENTRY_SPACING)
     
     # Save the PDF
     try:
@@ -75,6 +159,8 @@ def create_pdf_with_screenshots(transcripts, screenshot_paths, output_pdf_path):
     except Exception as e:
         print(f"Error saving PDF: {e}")
         return False
+    finally:
+        temp_dir.cleanup()
 
 def save_transcript_to_text(timestamped_chunks, output_path):
     """Save timestamped transcript to a text file."""
@@ -82,10 +168,10 @@ def save_transcript_to_text(timestamped_chunks, output_path):
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        with open(output_path, 'w') as f:
-            for timestamp, text in timestamped_chunks:
-                entry = f"[{timestamp}] {text}\n\n"
-                f.write(entry)
+        # Build the whole transcript once and write it in a single call
+        entries = [f"[{timestamp}] {text}\n\n" for timestamp, text in timestamped_chunks]
+        with open(output_path, 'w', buffering=1 << 20) as f:
+            f.write(''.join(entries))
         print(f"Transcript saved to {output_path}")
         return True
     except Exception as e:
@@ -1,38 +1,79 @@
 import os
-import tempfile
-import shutil
+
+# Whisper runs on CPU unless USE_GPU=1; hide CUDA before torch is imported
+_USE_GPU = os.environ.get("USE_GPU", "0") == "1"
+if not _USE_GPU:
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
 from pathlib import Path
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import torch
+import streamlit as st
 
-# Import the correct whisper package
-import whisper as openai_whisper
+# CTranslate2 port of Whisper (int8 kernels on CPU, int8/float16 on GPU)
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 from . import utils
 
-def transcribe_audio_chunk_with_whisper(audio_chunk, model_size="small"):
-    """Transcribe audio chunk using Whisper model on CPU."""
-    print(f"Transcribing {audio_chunk} with Whisper ({model_size} model on CPU)...")
-    
+# Number of 30-second audio windows decoded together by the batched pipeline
+BATCH_SIZE = 8
+
+# Segments Whisper thinks are probably silence and decoded with low confidence;
+# their text is usually a hallucinated filler like "Thank you." and is dropped.
+# Same rule as Whisper's own: no_speech_prob alone has false positives
+NO_SPEECH_THRESHOLD = 0.5
+LOG_PROB_THRESHOLD = -1.0
+
+def _is_silent(segment):
+    """Return True for segments that are both probably silent and low-confidence."""
+    return (segment.no_speech_prob > NO_SPEECH_THRESHOLD
+            and segment.avg_logprob < LOG_PROB_THRESHOLD)
+
+# Minimum seconds between per-segment progress updates for a job
+PROGRESS_INTERVAL = 1.0
+_LAST_CB = {}
+
+def _throttled_progress(progress_callback, job_id, text, progress):
+    """Forward a progress update at most once per PROGRESS_INTERVAL per job; 100% always goes through."""
+    now = time.monotonic()
+    if progress < 100 and now - _LAST_CB.get(job_id, 0) < PROGRESS_INTERVAL:
+        return
+    _LAST_CB[job_id] = now
+    progress_callback(job_id, text, progress)
+
+def get_default_device():
+    """Return "cuda" when GPU use is enabled and available, otherwise "cpu"."""
+    return "cuda" if _USE_GPU and torch.cuda.is_available() else "cpu"
+
+# Keep one model per process: loading another size evicts the previous one,
+# so a worker never holds more than a single model in memory
+@st.cache_resource(max_entries=1)
+def get_whisper_model(model_size, device="cpu"):
+    """Load a Whisper model once per (model_size, device) and reuse it across chunks and jobs."""
+    print(f"Loading Whisper {model_size} model on {device}...")
+    # int8 weights everywhere; on GPU the activations run in float16
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    return WhisperModel(model_size, device=device, compute_type=compute_type)
+
+def _remove_screenshots(paths):
+    """Delete screenshot files, logging any that can't be removed."""
+    for screenshot_path in paths:
+        try:
+            os.remove(screenshot_path)
+        except OSError as e:
+            print(f"Error removing screenshot {screenshot_path}: {e}")
+
+def _discard_frames(frames_future):
+    """Delete every frame captured by a screenshot pass whose job failed."""
     try:
-        # Force CPU by setting environment variable
-        os.environ["CUDA_VISIBLE_DEVICES"] = ""
-        device = "cpu"
-        
-        # Load the OpenAI Whisper model - explicitly use openai_whisper
-        model = openai_whisper.load_model(model_size, device=device)
-        
-        # Transcribe the audio with fp16=False to ensure CPU compatibility
-        result = model.transcribe(audio_chunk, fp16=False)
-        
-        # Return the transcript with segment-level timestamps
-        return result["text"], result.get("segments", [])
-    except Exception as e:
-        print(f"Error transcribing chunk {audio_chunk}: {e}")
-        raise  # Re-raise the exception to stop processing
+        frames = frames_future.result()
+    except Exception:
+        return
+    _remove_screenshots(frames.values())
 
 def process_video(job_id, video_path, whisper_model="small", 
-                  chunk_duration=300, timestamp_interval=30,
-                  progress_callback=None):
+                  timestamp_interval=30, progress_callback=None):
     """
     Process a video file to generate a transcript with timestamps.
     
@@ -40,16 +81,12 @@ def process_video(job_id, video_path, whisper_model="small",
         job_id: Unique job identifier
         video_path: Path to the video file
         whisper_model: Whisper model size
-        chunk_duration: Duration of each audio chunk in seconds
         timestamp_interval: Interval for screenshots in seconds
         progress_callback: Function to call with progress updates
         
     Returns:
         Tuple of (timestamped_chunks, screenshots_dict)
     """
-    # Force CPU at the beginning
-    os.environ["CUDA_VISIBLE_DEVICES"] = ""
-    
     if progress_callback:
         progress_callback(job_id, "Starting video processing...", 0)
     
@@ -57,103 +94,93 @@ def process_video(job_id, video_path, whisper_model="small",
     print(f"Processing video: {video_path}")
     print(f"Video exists: {os.path.exists(video_path)}")
     
-    # Create temporary directory for processing
-    with tempfile.TemporaryDirectory() as temp_dir:
-        if progress_callback:
-            progress_callback(job_id, "Created temporary directory", 5)
-        
-        # Directory for screenshots
-        screenshots_dir = os.path.join(temp_dir, "screenshots")
-        os.makedirs(screenshots_dir, exist_ok=True)
-        
-        # Extract audio from video
-        audio_path = os.path.join(temp_dir, "audio.mp3")
-        utils.extract_audio_from_video(video_path, audio_path)
+    # Screenshots are written straight to the job's persistent output directory
+    output_dir = os.path.join(os.getcwd(), "output", job_id)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    if progress_callback:
+        progress_callback(job_id, "Created output directory", 5)
+    
+    # Decode all periodic screenshots in one background pass, overlapping
+    # audio extraction and transcription
+    stop_screenshots = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    frames_future = executor.submit(utils.extract_screenshots, video_path,
+                                    output_dir, timestamp_interval, stop_screenshots)
+    try:
+        # Decode audio from video straight into memory as 16 kHz mono samples for Whisper
+        audio = utils.load_audio(video_path)
         
         if progress_callback:
-            progress_callback(job_id, "Extracted audio from video", 10)
-        
-        # Convert to WAV format for Whisper
-        wav_path = os.path.join(temp_dir, "audio.wav")
-        utils.convert_audio_to_wav(audio_path, wav_path)
+            progress_callback(job_id, "Extracted audio from video", 15)
         
+        # Transcribe the whole file in one batched pass; VAD windowing replaces manual chunking
         if progress_callback:
-            progress_callback(job_id, "Converted audio to WAV format", 15)
+            progress_callback(job_id, "Transcribing audio...", 20)
         
-        # Split audio into chunks
-        chunk_dir = os.path.join(temp_dir, "chunks")
-        audio_chunks, start_times, num_chunks = utils.split_audio_into_chunks(wav_path, chunk_dir, chunk_duration)
+        pipeline = BatchedInferencePipeline(model=get_whisper_model(whisper_model, get_default_device()))
+        segments, info = pipeline.transcribe(audio, batch_size=BATCH_SIZE,
+                                             vad_filter=True, word_timestamps=False)
         
-        if progress_callback:
-            progress_callback(job_id, f"Split audio into {num_chunks} chunks", 20)
-        
-        # Transcribe chunks and keep track of timestamps
+        # Transcribe segments and keep track of timestamps
         timestamped_chunks = []
         screenshots = {}
+        wanted = []
+        taken = set()
         
-        # Calculate progress increments for transcription
-        if len(audio_chunks) > 0:
-            # Reserve 60% of the progress for chunk processing (30% to 90%)
-            progress_per_chunk = 70 / len(audio_chunks)
-        else:
-            progress_per_chunk = 0
-        
-        for i, (chunk, start_time) in enumerate(zip(audio_chunks, start_times)):
-            current_progress = 25 + (i * progress_per_chunk)
-            if progress_callback:
-                progress_callback(job_id, f"Transcribing chunk {i+1}/{len(audio_chunks)}...", 
-                                 current_progress)
+        for segment in segments:
+            # Segment timestamps are already absolute
+            segment_start = segment.start
+            segment_text = segment.text.strip()
             
-            try:
-                # Transcribe with local Whisper
-                _, segments = transcribe_audio_chunk_with_whisper(chunk, model_size=whisper_model)
-                
-                # Process segments
-                for segment in segments:
-                    segment_start = segment.get('start', 0) + start_time
-                    segment_text = segment.get('text', '').strip()
-                    
-                    if not segment_text:
-                        continue
-                    
-                    # Format timestamp
-                    timestamp = utils.format_timestamp(segment_start)
-                    
-                    # Only take periodic screenshots based on timestamp_interval
-                    if int(segment_start) % timestamp_interval < 5:  # Within 5 seconds of interval
-                        screenshot_path = os.path.join(screenshots_dir, f"screenshot_{int(segment_start):06d}.jpg")
-                        if utils.extract_screenshot(video_path, screenshot_path, timestamp):
-                            screenshots[timestamp] = screenshot_path
-                    
-                    # Add to timestamped chunks
-                    timestamped_chunks.append((timestamp, segment_text))
-                
-                if progress_callback:
-                    progress_callback(job_id, f"Transcribed chunk {i+1}/{len(audio_chunks)}", 
-                                     current_progress + progress_per_chunk/2)
-                
-            except Exception as e:
-                print(f"Error processing chunk {i+1}: {e}")
-                continue  # Try to continue with next chunk
-        
-        if progress_callback:
-            progress_callback(job_id, "Finished transcription", 90)
-        
-        # Create persistent copies of screenshots
-        persistent_screenshots = {}
-        output_dir = os.path.join(os.getcwd(), "output", job_id)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        for timestamp, screenshot_path in screenshots.items():
-            new_path = os.path.join(output_dir, os.path.basename(screenshot_path))
-            try:
-                # Copy the screenshot to a persistent location
-                shutil.copy2(screenshot_path, new_path)
-                persistent_screenshots[timestamp] = new_path
-            except Exception as e:
-                print(f"Error copying screenshot {screenshot_path}: {e}")
-        
-        if progress_callback:
-            progress_callback(job_id, "Saved screenshots", 95)
+            if progress_callback and info.duration:
+                # Reserve 70% of the progress for transcription (20% to 90%)
+                progress = 20 + 70 * min(segment.end / info.duration, 1.0)
+                _throttled_progress(progress_callback, job_id, "Transcribing audio...", int(progress))
+            
+            if not segment_text or _is_silent(segment):
+                continue
+            
+            # Format timestamp
+            timestamp = utils.format_timestamp(segment_start)
+            
+            # Attach each periodic screenshot to the first segment within 5 seconds of it
+            bucket = (int(segment_start) // timestamp_interval) * timestamp_interval
+            if bucket not in taken and int(segment_start) - bucket < 5:
+                wanted.append((timestamp, bucket))
+                taken.add(bucket)
+            
+            # Add to timestamped chunks
+            timestamped_chunks.append((timestamp, segment_text))
+        
+        try:
+            frames = frames_future.result()
+        except Exception as e:
+            print(f"Error extracting screenshots: {e}")
+            frames = {}
+    except BaseException:
+        # The job won't finish: stop the screenshot pass rather than waiting
+        # for it, and don't leave its frames in the output directory
+        stop_screenshots.set()
+        _discard_frames(frames_future)
+        raise
+    finally:
+        executor.shutdown()
+        # Workers outlive their jobs, so drop the job's throttle state
+        _LAST_CB.pop(job_id, None)
+    
+    for timestamp, bucket in wanted:
+        if bucket in frames:
+            screenshots[timestamp] = frames[bucket]
+    
+    if progress_callback:
+        progress_callback(job_id, "Finished transcription", 90)
+    
+    # Drop frames captured for intervals that had no speech
+    used = set(screenshots.values())
+    _remove_screenshots(path for path in frames.values() if path not in used)
+    
+    if progress_callback:
+        progress_callback(job_id, "Saved screenshots", 95)
     
-    return timestamped_chunks, persistent_screenshots
\ No newline at end of file
+    return timestamped_chunks, screenshots
\ No newline at end of file
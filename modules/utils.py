@@ -1,164 +1,170 @@
 import datetime
 import os
-import json
+import orjson
 import subprocess
 import tempfile
 import shutil
 from pathlib import Path
 import uuid
+import threading
+import av
+import numpy as np
+from PIL import Image
+
+# In-process job state; the JSON files are written through on status changes
+# and every PROGRESS_SAVE_STEP percent so background jobs don't rewrite them
+# on every progress tick
+PROGRESS_SAVE_STEP = 5
+_JOB_STATE = {}
+_SAVED_STATE = {}
+_JOB_LOCK = threading.RLock()
+
+# Parsed job files, keyed by path and reused by list_jobs until the file changes
+_LIST_CACHE = {}
+
+# Directories already created by this process, so hot paths skip the mkdir syscall
+_ENSURED_DIRS = set()
+_JOBS_DIR = os.path.join(os.getcwd(), "jobs")
+
+# Screenshots are shown 180 mm wide in the PDF, so cap them at that width at
+# 150 DPI (the PDF then embeds them as-is) and use a fast baseline JPEG
+# encode (optimize=True roughly triples encode time)
+SCREENSHOT_SIZE = (1063, 1063)
+SCREENSHOT_JPEG_OPTIONS = {'quality': 80, 'optimize': False, 'progressive': False, 'subsampling': 2}
+
+def _ensure_dir(path):
+    """Create a directory (and parents) the first time it is needed."""
+    if path not in _ENSURED_DIRS:
+        os.makedirs(path, exist_ok=True)
+        _ENSURED_DIRS.add(path)
+
+def _forget_dir(path):
+    """Forget a removed directory and everything under it, so it is recreated on next use."""
+    for ensured in list(_ENSURED_DIRS):
+        if ensured == path or ensured.startswith(path + os.sep):
+            _ENSURED_DIRS.discard(ensured)
 
 def format_timestamp(seconds):
     """Convert seconds to HH:MM:SS format."""
-    return str(datetime.timedelta(seconds=int(seconds)))
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
 
-def extract_audio_from_video(video_path, audio_path):
-    """Extract audio from video file using ffmpeg."""
-    print(f"Extracting audio from {video_path}...")
+def load_audio(video_path, sample_rate=16000):
+    """Decode a video's audio track to a mono float32 NumPy array at sample_rate."""
+    print(f"Loading audio from {video_path}...")
     
     # Verify the video file exists
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video file not found: {video_path}")
     
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
-    
-    # Debug info
-    print(f"Video path: {video_path}")
-    print(f"Audio path: {audio_path}")
-    
-    # Use subprocess with shell=False for better security
+    # Stream raw PCM over stdout so no intermediate audio file touches the disk
     cmd = [
         'ffmpeg',
+        '-loglevel', 'error',
+        '-nostats',
         '-i', video_path,
-        '-q:a', '0',
-        '-map', 'a',
-        '-y',  # Overwrite output file if it exists
-        audio_path
-    ]
-    
-    try:
-        process = subprocess.run(cmd, check=True, text=True, capture_output=True)
-        print("Audio extraction successful")
-    except subprocess.CalledProcessError as e:
-        print(f"Error in ffmpeg: {e.stderr}")
-        raise
-
-def convert_audio_to_wav(mp3_path, wav_path):
-    """Convert audio to WAV format for better compatibility."""
-    print(f"Converting audio to WAV format...")
-    
-    # Verify the mp3 file exists
-    if not os.path.exists(mp3_path):
-        raise FileNotFoundError(f"Audio file not found: {mp3_path}")
-    
-    cmd = [
-        'ffmpeg',
-        '-i', mp3_path,
+        '-vn',
+        '-f', 's16le',
         '-acodec', 'pcm_s16le',
-        '-ar', '16000',
+        '-ar', str(sample_rate),
         '-ac', '1',
-        '-y',
-        wav_path
+        '-'
     ]
     
     try:
-        process = subprocess.run(cmd, check=True, text=True, capture_output=True)
-        print("Audio conversion successful")
+        process = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        print("Audio extraction successful")
     except subprocess.CalledProcessError as e:
-        print(f"Error in ffmpeg: {e.stderr}")
+        print(f"Error in ffmpeg: {e.stderr.decode(errors='replace')}")
         raise
+    
+    return np.frombuffer(process.stdout, np.int16).astype(np.float32) / 32768.0
 
-def extract_screenshot(video_path, output_path, timestamp):
-    """Extract a screenshot from the video at the given timestamp."""
+def _media_duration(container, stream):
+    """Return the duration of a video in seconds, or None if the file doesn't record it."""
+    if container.duration:
+        return container.duration / av.time_base
+    if stream.duration and stream.time_base:
+        return float(stream.duration * stream.time_base)
+    return None
+
+def _decode_frame_at(container, stream, seconds):
+    """Return the first frame at or after `seconds`, or None past the end of the video."""
+    # Seek to the keyframe before the target, then decode forward to it
+    container.seek(int(seconds * av.time_base))
+    for frame in container.decode(stream):
+        if frame.time is not None and frame.time < seconds:
+            continue
+        return frame
+    return None
+
+def extract_screenshots(video_path, output_dir, interval, stop_event=None):
+    """Extract one screenshot every `interval` seconds in a single pass over the video.
+    
+    Returns a dict mapping each captured time (in whole seconds) to its JPEG path.
+    Setting `stop_event` (a threading.Event) ends the pass at the next interval.
+    """
     # Verify the video file exists
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video file not found: {video_path}")
     
-    cmd = [
-        'ffmpeg',
-        '-ss', timestamp,
-        '-i', video_path,
-        '-frames:v', '1',
-        '-q:v', '2',
-        '-y',
-        output_path
-    ]
-    
-    try:
-        process = subprocess.run(cmd, check=True, text=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error extracting screenshot: {e.stderr}")
-        return False
-    
-    # Verify image was created
-    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-        print(f"Warning: Failed to extract screenshot at {timestamp}")
-        return False
-    
-    return True
-
-def split_audio_into_chunks(audio_path, chunk_dir, chunk_duration=300):
-    """Split audio into smaller chunks for processing."""
-    print(f"Splitting audio into {chunk_duration}-second chunks...")
-    
-    # Verify the audio file exists
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-    
-    os.makedirs(chunk_dir, exist_ok=True)
-    
-    # Get total duration of the audio file
-    cmd = [
-        'ffprobe', 
-        '-v', 'error', 
-        '-show_entries', 'format=duration', 
-        '-of', 'json', 
-        audio_path
-    ]
+    _ensure_dir(output_dir)
+    screenshots = {}
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        duration = float(json.loads(result.stdout)['format']['duration'])
-        print(f"Audio duration: {duration} seconds")
-    except subprocess.CalledProcessError as e:
-        print(f"Error getting audio duration: {e.stderr}")
-        raise
-    
-    # Calculate number of chunks
-    num_chunks = int(duration / chunk_duration) + 1
-    chunk_files = []
-    timestamps = []
-    
-    print(f"Splitting into {num_chunks} chunks...")
-    
-    # Split audio into chunks
-    for i in range(num_chunks):
-        chunk_path = os.path.join(chunk_dir, f"chunk_{i:03d}.wav")
-        start_time = i * chunk_duration
-        
-        cmd = [
-            'ffmpeg',
-            '-i', audio_path,
-            '-ss', str(start_time),
-            '-t', str(chunk_duration),
-            '-c:a', 'pcm_s16le',
-            '-ar', '16000',
-            '-ac', '1',
-            '-y',
-            chunk_path
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, text=True, capture_output=True)
-            print(f"Created chunk {i+1}/{num_chunks}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error splitting audio chunk {i}: {e.stderr}")
-            raise
+        with av.open(video_path) as container:
+            if not container.streams.video:
+                print(f"Warning: No video stream in {video_path}, skipping screenshots")
+                return screenshots
+            
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            
+            start = (container.start_time or 0) / av.time_base
+            # Fragmented MP4s and live recordings may not record a duration;
+            # then keep going until a seek runs past the last frame
+            duration = _media_duration(container, stream)
             
-        chunk_files.append(chunk_path)
-        timestamps.append(start_time)
+            target = 0
+            last_time = None
+            while duration is None or target <= duration:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                screenshot_path = os.path.join(output_dir, f"screenshot_{target:06d}.jpg")
+                try:
+                    frame = _decode_frame_at(container, stream, start + target)
+                    if frame is None:
+                        break
+                    if duration is None:
+                        # Without a known end, untimestamped frames or a seek that
+                        # no longer moves forward also mean the end was reached
+                        if frame.time is None:
+                            if target > 0:
+                                break
+                        elif last_time is not None and frame.time <= last_time:
+                            break
+                        else:
+                            last_time = frame.time
+                    img = frame.to_image()
+                    img.thumbnail(SCREENSHOT_SIZE, Image.BILINEAR)
+                    img.save(screenshot_path, "JPEG", **SCREENSHOT_JPEG_OPTIONS)
+                    screenshots[target] = screenshot_path
+                except av.error.FFmpegError as e:
+                    print(f"Error extracting screenshot at {target}s: {e}")
+                    if duration is None:
+                        # Without a known end, a failing seek is treated as the end
+                        break
+                except (OSError, ValueError) as e:
+                    print(f"Error saving screenshot at {target}s: {e}")
+                    if os.path.exists(screenshot_path):
+                        os.remove(screenshot_path)
+                target += interval
+    except (av.error.FFmpegError, OSError) as e:
+        print(f"Error extracting screenshots: {e}")
     
-    return chunk_files, timestamps, num_chunks
+    print(f"Extracted {len(screenshots)} screenshots")
+    return screenshots
 
 def generate_job_id():
     """Generate a unique job ID."""
@@ -166,32 +172,48 @@ def generate_job_id():
 
 def get_jobs_dir():
     """Get jobs directory path."""
-    jobs_dir = os.path.join(os.getcwd(), "jobs")
-    os.makedirs(jobs_dir, exist_ok=True)
-    return jobs_dir
+    _ensure_dir(_JOBS_DIR)
+    return _JOBS_DIR
+
+def job_exists(job_id):
+    """Return True while the job's status file exists, i.e. it has not been deleted."""
+    return os.path.exists(os.path.join(get_jobs_dir(), f"{job_id}.json"))
 
 def save_job_status(job_id, status_data):
     """Save job status to JSON file."""
     jobs_dir = get_jobs_dir()
     job_file = os.path.join(jobs_dir, f"{job_id}.json")
     
-    try:
-        with open(job_file, 'w') as f:
-            json.dump(status_data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving job status: {e}")
+    with _JOB_LOCK:
+        # Keep the in-memory copy in sync for jobs tracked in this process
+        if job_id in _JOB_STATE:
+            _JOB_STATE[job_id] = dict(status_data)
+            _SAVED_STATE[job_id] = (status_data.get('status'), status_data.get('progress'))
+        
+        # Write to a temp file and swap it in, so readers never see a partial file
+        tmp_file = job_file + '.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(status_data, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, job_file)
+        except Exception as e:
+            print(f"Error saving job status: {e}")
 
 def load_job_status(job_id):
-    """Load job status from JSON file."""
+    """Load job status, preferring the in-memory copy over the JSON file."""
+    with _JOB_LOCK:
+        if job_id in _JOB_STATE:
+            return dict(_JOB_STATE[job_id])
+    
     jobs_dir = get_jobs_dir()
     job_file = os.path.join(jobs_dir, f"{job_id}.json")
     
     if os.path.exists(job_file):
         try:
-            with open(job_file, 'r') as f:
-                data = json.load(f)
+            with open(job_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 return data
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             print(f"Error: Job file {job_file} contains invalid JSON")
             return {"status": "Error", "error": "Invalid job file format"}
         except Exception as e:
@@ -199,6 +221,36 @@ def load_job_status(job_id):
             return {"status": "Error", "error": str(e)}
     return None
 
+def update_job_status(job_id, status, progress):
+    """Update a running job's status and progress in memory.
+    
+    The JSON file is only rewritten when the status text changes or progress
+    has moved at least PROGRESS_SAVE_STEP since the last save.
+    """
+    with _JOB_LOCK:
+        if job_id not in _JOB_STATE:
+            job_status = load_job_status(job_id)
+            if job_status is None:
+                # The job was deleted; don't recreate its file
+                return
+            _JOB_STATE[job_id] = job_status
+        
+        job_status = _JOB_STATE[job_id]
+        job_status['status'] = status
+        job_status['progress'] = progress
+        job_status['updated_at'] = datetime.datetime.now().isoformat()
+        
+        saved_status, saved_progress = _SAVED_STATE.get(job_id, (None, None))
+        if (status != saved_status or saved_progress is None
+                or abs(progress - saved_progress) >= PROGRESS_SAVE_STEP):
+            save_job_status(job_id, job_status)
+
+def release_job_state(job_id):
+    """Forget a job's in-memory state once this process is done with it."""
+    with _JOB_LOCK:
+        _JOB_STATE.pop(job_id, None)
+        _SAVED_STATE.pop(job_id, None)
+
 def list_jobs():
     """List all available jobs."""
     jobs_dir = get_jobs_dir()
@@ -207,10 +259,31 @@ def list_jobs():
     if not os.path.exists(jobs_dir):
         return jobs
     
-    for file in os.listdir(jobs_dir):
-        if file.endswith('.json'):
-            job_id = file.replace('.json', '')
-            job_data = load_job_status(job_id)
+    seen = set()
+    with os.scandir(jobs_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            
+            job_id = entry.name[:-len('.json')]
+            seen.add(entry.path)
+            
+            with _JOB_LOCK:
+                in_memory = job_id in _JOB_STATE
+            
+            if in_memory:
+                job_data = load_job_status(job_id)
+            else:
+                # Only re-parse files that changed since the last listing
+                stat = entry.stat()
+                version = (stat.st_mtime_ns, stat.st_size)
+                cached = _LIST_CACHE.get(entry.path)
+                if cached and cached[0] == version:
+                    job_data = cached[1]
+                else:
+                    job_data = load_job_status(job_id)
+                    _LIST_CACHE[entry.path] = (version, job_data)
+            
             if job_data:
                 jobs.append({
                     'job_id': job_id,
@@ -220,11 +293,18 @@ def list_jobs():
                     'completed_at': job_data.get('completed_at', '')
                 })
     
+    # Forget files that have been deleted
+    for path in list(_LIST_CACHE):
+        if path not in seen:
+            _LIST_CACHE.pop(path, None)
+    
     # Sort by creation time, newest first
     return sorted(jobs, key=lambda x: x.get('created_at', ''), reverse=True)
 
 def delete_job(job_id):
     """Delete a job and its associated files."""
+    release_job_state(job_id)
+    
     # Delete job status file
     jobs_dir = get_jobs_dir()
     job_file = os.path.join(jobs_dir, f"{job_id}.json")
@@ -236,10 +316,12 @@ def delete_job(job_id):
     output_dir = os.path.join(os.getcwd(), "output", job_id)
     if os.path.exists(output_dir):
         shutil.rmtree(output_dir)
+    _forget_dir(output_dir)
     
     # Delete job temp directory
     temp_dir = os.path.join(os.getcwd(), "temp_processing", job_id)
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
+    _forget_dir(temp_dir)
     
     return True
\ No newline at end of file